@@ -0,0 +1,32 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import create_access_token
+
+from models import db, User
+
+auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
+
+# --- AUTHENTICATION ENDPOINTS ---
+@auth_bp.route('/signup', methods=['POST'])
+def signup():
+    data = request.get_json()
+    email = data['email']
+    name = data['name']
+    password = data['password']
+
+    if User.query.filter_by(email=email).first():
+        return jsonify({"msg": "Email already exists"}), 409
+
+    new_user = User(email=email, name=name)
+    new_user.set_password(password)
+    db.session.add(new_user)
+    db.session.commit()
+    return jsonify({"msg": "User created successfully"}), 201
+
+@auth_bp.route('/login', methods=['POST'])
+def login():
+    data = request.get_json()
+    user = User.query.filter_by(email=data['email']).first()
+    if user and user.check_password(data['password']):
+        access_token = create_access_token(identity=str(user.id))
+        return jsonify(access_token=access_token)
+    return jsonify({"msg": "Bad email or password"}), 401
@@ -0,0 +1,106 @@
+"""
+Measures expense write throughput against the number of shard databases.
+
+Every writer process commits expenses (one expense plus two shares per commit,
+like a POST from the app) into its own group. With one database all writers
+queue on the same SQLite write lock; with more shards the groups spread out
+and commits proceed in parallel.
+
+Usage: python benchmarks/shard_writes.py [--writers 8] [--commits 300] [--shards 1,2,4,8]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import multiprocessing
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_one(shards, writers, commits):
+    """Runs inside a fresh interpreter so each shard count starts from empty databases."""
+    workdir = tempfile.mkdtemp(prefix='shard-bench-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{workdir}/global.db'
+    os.environ['SHARD_DATABASE_URLS'] = ','.join(f'sqlite:///{workdir}/shard{i}.db' for i in range(shards))
+    sys.path.insert(0, BACKEND_DIR)
+
+    from app import create_app
+    from models import db, User, Group, GroupMember, Expense, ExpenseShare, SplitType
+    from sharding import create_shard_tables, place_new_group, shard_for_group, using_shard
+
+    app = create_app({'DEBUG': False})
+    with app.app_context():
+        db.create_all()
+        create_shard_tables()
+        user = User(email='bench@example.com', name='Bench', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        group_ids = []
+        for i in range(writers):
+            group = Group(id=place_new_group(), name=f'bench {i}', admin_user_id=user_id)
+            db.session.add(group)
+            db.session.flush()
+            db.session.add(GroupMember(user_id=user_id, group_id=group.id))
+            db.session.commit()
+            group_ids.append(group.id)
+
+    def writer(group_id):
+        with app.app_context():
+            with using_shard(shard_for_group(group_id)):
+                for i in range(commits):
+                    expense = Expense(description=f'expense {i}', total_amount=10.0, group_id=group_id,
+                                      payer_id=user_id, split_type=SplitType.EQUAL)
+                    expense.shares = [ExpenseShare(user_id=user_id, amount_share=5.0),
+                                      ExpenseShare(user_id=user_id, amount_share=5.0)]
+                    db.session.add(expense)
+                    db.session.commit()
+
+    # Separate processes, like app workers, so the GIL doesn't hide the lock contention.
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=writer, args=(gid,)) for gid in group_ids]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        if p.exitcode != 0:
+            raise SystemExit(f'writer failed with exit code {p.exitcode}')
+    elapsed = time.perf_counter() - start
+    print(f'{writers * commits / elapsed:.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--commits', type=int, default=300, help='Commits per writer.')
+    parser.add_argument('--shards', default='1,2,4,8')
+    parser.add_argument('--run-one', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(args.run_one, args.writers, args.commits)
+        return
+
+    print(f"{'='*10} SHARD WRITE THROUGHPUT ({args.writers} writers x {args.commits} commits) {'='*10}")
+    baseline = None
+    for shards in [int(s) for s in args.shards.split(',')]:
+        out = subprocess.run(
+            [sys.executable, __file__, '--run-one', str(shards),
+             '--writers', str(args.writers), '--commits', str(args.commits)],
+            capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            sys.exit(out.stderr)
+        rate = float(out.stdout.strip().splitlines()[-1])
+        baseline = baseline or rate
+        print(f"  -> {shards} shard(s): {rate:8.0f} commits/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
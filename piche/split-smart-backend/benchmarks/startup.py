@@ -0,0 +1,75 @@
+"""
+Measures worker cold start: import time, app creation and time-to-first-request.
+
+Each sample runs in a fresh interpreter. The "cli" profile builds the app the
+way the `flask` command does (Migrate and CLI commands registered); the
+"worker" profile is what wsgi.py serves, with that machinery skipped.
+
+Usage: python benchmarks/startup.py [--runs 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'cli': {'DEBUG': False},
+    'worker': {'DEBUG': False, 'REGISTER_CLI': False},
+}
+
+SAMPLE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+# An unknown login still runs a query, so this includes the first DB connection.
+resp = app.test_client().post('/api/auth/login', json={'email': 'nobody@example.com', 'password': 'x'})
+assert resp.status_code == 401, resp.status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first_request': served - created, 'total': served - start}))
+"""
+
+
+def sample(profile, db_url):
+    env = dict(os.environ, DATABASE_URL=db_url, JWT_SECRET_KEY='bench-secret-key-0123456789abcdef')
+    out = subprocess.run([sys.executable, '-c', SAMPLE, json.dumps(PROFILES[profile])],
+                         cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.exit(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=15)
+    args = parser.parse_args()
+
+    db_url = f'sqlite:///{tempfile.mkdtemp(prefix="startup-bench-")}/splitsmart.db'
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app
+    from models import db
+    with create_app({'SQLALCHEMY_DATABASE_URI': db_url}).app_context():
+        db.create_all()
+
+    print(f"{'='*10} WORKER STARTUP (median of {args.runs} runs, ms) {'='*10}")
+    print(f"  {'profile':<8} {'import':>8} {'create_app':>11} {'1st req':>8} {'total':>8}")
+    medians = {}
+    for profile in PROFILES:
+        runs = [sample(profile, db_url) for _ in range(args.runs)]
+        medians[profile] = {k: statistics.median(r[k] for r in runs) * 1000 for k in runs[0]}
+        m = medians[profile]
+        print(f"  {profile:<8} {m['import']:8.1f} {m['create_app']:11.1f} {m['first_request']:8.1f} {m['total']:8.1f}")
+    saved = medians['cli']['total'] - medians['worker']['total']
+    print(f"  -> worker profile saves {saved:.1f} ms ({saved / medians['cli']['total']:.0%})")
+
+
+if __name__ == '__main__':
+    main()
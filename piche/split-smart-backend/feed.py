@@ -0,0 +1,131 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect
+
+from models import db, ShardedSession, User, Expense, ExpenseShare, ExpenseFeed
+from sharding import create_shard_tables, each_shard
+
+feed_cli = AppGroup('feed', help='Maintain the expense feed read model.')
+
+REBUILD_BATCH = 500
+
+
+def get_feed(group_id):
+    """Returns a group's expenses, newest first, from the expense_feed projection."""
+    rows = ExpenseFeed.query.filter_by(group_id=group_id).order_by(ExpenseFeed.date.desc())
+    return [
+        {
+            "id": row.expense_id,
+            "description": row.description,
+            "amount": row.total_amount,
+            "date": row.date.isoformat(),
+            "paidBy": row.payer_id,
+            "payerName": row.payer_name,
+            "splitType": row.split_type.value,
+            "category": "General", # Example category
+            "isSmartContract": False,
+            "participants": row.participants,
+        } for row in rows
+    ]
+
+
+def refresh_feed(session, expense_ids):
+    """
+    Rewrites the feed rows of the given expenses from the source tables.
+
+    Expenses that no longer exist simply lose their row. Runs on the session's
+    current connections, so it commits or rolls back with the write that
+    triggered it.
+    """
+    if not expense_ids:
+        return
+    feed = ExpenseFeed.__table__
+    expense_ids = list(expense_ids)
+    session.execute(feed.delete().where(feed.c.expense_id.in_(expense_ids)))
+
+    # Plain column queries: they don't touch the identity map, where expense ids
+    # from different shards could collide.
+    expenses = session.query(
+        Expense.id, Expense.group_id, Expense.date, Expense.description,
+        Expense.total_amount, Expense.payer_id, Expense.split_type,
+    ).filter(Expense.id.in_(expense_ids)).all()
+    if not expenses:
+        return
+    shares = {}
+    for expense_id, user_id, amount in (session.query(ExpenseShare.expense_id, ExpenseShare.user_id,
+                                                      ExpenseShare.amount_share)
+                                        .filter(ExpenseShare.expense_id.in_(expense_ids))
+                                        .order_by(ExpenseShare.id)):
+        shares.setdefault(expense_id, []).append((user_id, amount))
+    # Users can live in another database than the group, so names are looked
+    # up separately instead of joined.
+    user_ids = {e.payer_id for e in expenses} | {u for rows in shares.values() for u, _ in rows}
+    names = dict(session.query(User.id, User.name).filter(User.id.in_(user_ids)))
+
+    session.execute(feed.insert(), [
+        {
+            "expense_id": e.id,
+            "group_id": e.group_id,
+            "date": e.date,
+            "description": e.description,
+            "total_amount": e.total_amount,
+            "payer_id": e.payer_id,
+            "payer_name": names.get(e.payer_id, ''),
+            "split_type": e.split_type,
+            "participants": [
+                {"user_id": user_id, "name": names.get(user_id, ''), "amount": amount}
+                for user_id, amount in shares.get(e.id, [])
+            ],
+        } for e in expenses
+    ])
+
+
+def _expenses_of_users(session, user_ids):
+    paid = session.query(Expense.id).filter(Expense.payer_id.in_(user_ids))
+    shared = session.query(ExpenseShare.expense_id).filter(ExpenseShare.user_id.in_(user_ids))
+    return {expense_id for (expense_id,) in paid.union(shared)}
+
+
+@event.listens_for(ShardedSession, 'after_flush')
+def _collect_feed_changes(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote.
+    expense_ids = session.info.setdefault('feed_expense_ids', set())
+    renamed = session.info.setdefault('feed_renamed_user_ids', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Expense):
+            expense_ids.add(obj.id)
+        elif isinstance(obj, ExpenseShare):
+            expense_ids.add(obj.expense_id)
+        elif isinstance(obj, User) and obj in session.dirty and inspect(obj).attrs.name.history.has_changes():
+            renamed.add(obj.id)
+
+
+@event.listens_for(ShardedSession, 'after_flush_postexec')
+def _update_feed(session, flush_context):
+    expense_ids = session.info.pop('feed_expense_ids', set())
+    renamed = session.info.pop('feed_renamed_user_ids', set())
+    expense_ids.discard(None)
+    with session.no_autoflush:
+        refresh_feed(session, expense_ids)
+        if renamed:
+            # A user's expenses can be in any shard.
+            for _ in each_shard():
+                refresh_feed(session, _expenses_of_users(session, renamed))
+
+
+@feed_cli.command('rebuild')
+def rebuild_command():
+    """Recompute every expense_feed row from the expense tables."""
+    # Shards configured after the feed migration ran don't have the table yet.
+    create_shard_tables()
+    total = 0
+    for shard_key in each_shard():
+        feed = ExpenseFeed.__table__
+        db.session.execute(feed.delete())
+        ids = [expense_id for (expense_id,) in db.session.query(Expense.id).order_by(Expense.id)]
+        for i in range(0, len(ids), REBUILD_BATCH):
+            refresh_feed(db.session, ids[i:i + REBUILD_BATCH])
+        db.session.commit()
+        total += len(ids)
+        click.echo(f'{shard_key or "default"}: {len(ids)} expense(s)')
+    click.echo(f'Rebuilt the feed for {total} expense(s).')
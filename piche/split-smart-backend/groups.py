@@ -0,0 +1,208 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from models import db, User, Group, GroupMember, Role
+from splits import simplify_debts
+from search import search_expenses, MAX_PER_PAGE, MAX_OFFSET
+from sharding import place_new_group, each_shard, group_homes
+from feed import get_feed
+
+groups_bp = Blueprint('groups', __name__, url_prefix='/api')
+
+@groups_bp.route('/groups', methods=['POST'])
+@jwt_required()
+def create_group():
+    user_id = int(get_jwt_identity())
+    data = request.get_json()
+    new_group = Group(id=place_new_group(), name=data['name'], admin_user_id=user_id)
+    db.session.add(new_group)
+    db.session.flush()
+    membership = GroupMember(user_id=user_id, group_id=new_group.id, role=Role.ADMIN)
+    db.session.add(membership)
+    db.session.commit()
+    return jsonify({"id": new_group.id, "name": new_group.name}), 201
+
+# --- GET USER GROUPS ---
+@groups_bp.route('/groups', methods=['GET'])
+@jwt_required()
+def get_user_groups():
+    user_id = int(get_jwt_identity())
+    # A user's groups can be spread over every shard, so ask each one.
+    rows = []
+    for shard_key in each_shard():
+        query = db.session.query(Group.id, Group.name).join(GroupMember).filter(GroupMember.user_id == user_id)
+        rows.extend((shard_key, group_id, name) for group_id, name in query)
+    # An interrupted move leaves a stale copy until the next rebalance, so only
+    # keep each group from the database the directory points at.
+    homes = group_homes([group_id for _, group_id, _ in rows])
+    return jsonify([{"id": group_id, "name": name} for shard_key, group_id, name in rows
+                    if homes.get(group_id, shard_key) == shard_key])
+
+# --- GET GROUP DETAILS ---
+@groups_bp.route('/groups/<int:group_id>', methods=['GET'])
+@jwt_required()
+def get_group_details(group_id):
+    user_id = int(get_jwt_identity())
+    if not GroupMember.query.filter_by(group_id=group_id, user_id=user_id).first():
+        return jsonify({"msg": "Access denied"}), 403
+    group = Group.query.get(group_id)
+    members = [{"id": gm.user.id, "name": gm.user.name} for gm in group.members]
+    return jsonify({"id": group.id, "name": group.name, "members": members})
+
+@groups_bp.route('/groups/<int:group_id>/expenses', methods=['GET'])
+@jwt_required()
+def get_expenses(group_id):
+    user_id = int(get_jwt_identity())
+    if not GroupMember.query.filter_by(group_id=group_id, user_id=user_id).first():
+        return jsonify({"msg": "Access denied"}), 403
+    # Served from the expense_feed projection: one index range scan, no joins.
+    return jsonify(get_feed(group_id))
+
+# --- SEARCH EXPENSES ---
+@groups_bp.route('/groups/<int:group_id>/expenses/search', methods=['GET'])
+@jwt_required()
+def search_group_expenses(group_id):
+    user_id = int(get_jwt_identity())
+    if not GroupMember.query.filter_by(group_id=group_id, user_id=user_id).first():
+        return jsonify({"msg": "Access denied"}), 403
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"msg": "Missing search query 'q'"}), 400
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE))
+    if (page - 1) * per_page > MAX_OFFSET:
+        return jsonify({"msg": "'page' is out of range"}), 400
+
+    results, has_more = search_expenses(group_id, query, page=page, per_page=per_page)
+    return jsonify({"results": results, "page": page, "per_page": per_page, "has_more": has_more})
+
+# --- GET BALANCES ---
+@groups_bp.route('/groups/<int:group_id>/balances', methods=['GET'])
+@jwt_required()
+def get_balances(group_id):
+    user_id = int(get_jwt_identity())
+    if not GroupMember.query.filter_by(group_id=group_id, user_id=user_id).first():
+        return jsonify({"msg": "Access denied"}), 403
+    
+    group = Group.query.get(group_id)
+    balances = {member.user_id: 0.0 for member in group.members}
+    for expense in group.expenses:
+        balances[expense.payer_id] += expense.total_amount
+        for share in expense.shares:
+            balances[share.user_id] -= share.amount_share
+            
+    return jsonify([{"user_id": uid, "balance": round(bal, 2)} for uid, bal in balances.items()])
+
+# --- SIMPLIFY DEBTS ---
+@groups_bp.route('/groups/<int:group_id>/simplify', methods=['GET'])
+@jwt_required()
+def get_simplified_debts(group_id):
+    user_id = int(get_jwt_identity())
+    if not GroupMember.query.filter_by(group_id=group_id, user_id=user_id).first():
+        return jsonify({"msg": "Access denied"}), 403
+    
+    group = Group.query.get(group_id)
+    balances = {member.user_id: 0.0 for member in group.members}
+    for expense in group.expenses:
+        balances[expense.payer_id] += expense.total_amount
+        for share in expense.shares:
+            balances[share.user_id] -= share.amount_share
+            
+    transactions = simplify_debts(balances)
+    return jsonify(transactions)
+
+@groups_bp.route('/groups/<int:group_id>/members', methods=['POST'])
+@jwt_required()
+def add_group_member(group_id):
+    # Only group admin can add new members
+    admin_id = int(get_jwt_identity())
+    group = Group.query.get(group_id)
+    if not group or group.admin_user_id != admin_id:
+        return jsonify({"msg": "Access denied: Only the group admin can add members"}), 403
+
+    data = request.get_json()
+    new_user_id = data.get('user_id')
+
+    # Check if the user to be added exists
+    if not User.query.get(new_user_id):
+        return jsonify({"msg": "User to be added does not exist"}), 404
+
+    # Check if user is already a member
+    if GroupMember.query.filter_by(group_id=group_id, user_id=new_user_id).first():
+        return jsonify({"msg": "User is already a member of this group"}), 409
+
+    # Add the new member
+    new_membership = GroupMember(group_id=group_id, user_id=new_user_id, role=Role.MEMBER)
+    db.session.add(new_membership)
+    db.session.commit()
+
+    return jsonify({"msg": f"User {new_user_id} added to group {group_id}"}), 201
+
+MAX_BATCH_MEMBERS = 500
+# Largest id a BIGINT column can hold; anything bigger overflows the query.
+MAX_USER_ID = 2**63 - 1
+
+def _is_user_id(entry):
+    return isinstance(entry, int) and not isinstance(entry, bool) and 1 <= entry <= MAX_USER_ID
+
+@groups_bp.route('/groups/<int:group_id>/members:batch', methods=['POST'])
+@jwt_required()
+def add_group_members_batch(group_id):
+    # Only group admin can add new members
+    admin_id = int(get_jwt_identity())
+    group = Group.query.get(group_id)
+    if not group or group.admin_user_id != admin_id:
+        return jsonify({"msg": "Access denied: Only the group admin can add members"}), 403
+
+    # Each entry is a user id or an email, e.g. {"members": [4, "bob@example.com"]}
+    data = request.get_json(silent=True)
+    entries = data.get('members') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"msg": "'members' must be a non-empty list of user ids or emails"}), 400
+    if len(entries) > MAX_BATCH_MEMBERS:
+        return jsonify({"msg": f"At most {MAX_BATCH_MEMBERS} members can be added per request"}), 400
+
+    ids = {e for e in entries if _is_user_id(e)}
+    emails = {e.strip() for e in entries if isinstance(e, str)}
+
+    # Resolve every entry in one query...
+    users = db.session.query(User.id, User.email).filter(
+        db.or_(User.id.in_(ids), User.email.in_(emails))).all()
+    found_ids = {u.id for u in users}
+    by_email = {u.email: u.id for u in users}
+    # ...and find the existing memberships in another.
+    existing = {user_id for (user_id,) in db.session.query(GroupMember.user_id).filter(
+        GroupMember.group_id == group_id, GroupMember.user_id.in_(found_ids))}
+
+    results = []
+    to_add = []
+    seen = set()
+    for entry in entries:
+        if _is_user_id(entry):
+            user_id = entry if entry in found_ids else None
+        elif isinstance(entry, str):
+            user_id = by_email.get(entry.strip())
+        else:
+            results.append({"entry": entry, "status": "invalid"})
+            continue
+
+        if user_id is None:
+            status = "not_found"
+        elif user_id in seen:
+            status = "duplicate"
+        elif user_id in existing:
+            status = "already_member"
+        else:
+            status = "added"
+            to_add.append({"group_id": group_id, "user_id": user_id, "role": Role.MEMBER})
+        if user_id is not None:
+            seen.add(user_id)
+        results.append({"entry": entry, "user_id": user_id, "status": status})
+
+    if to_add:
+        # One multi-row INSERT instead of a flush per member.
+        db.session.execute(db.insert(GroupMember), to_add)
+        db.session.commit()
+
+    return jsonify({"added": len(to_add), "results": results}), 200
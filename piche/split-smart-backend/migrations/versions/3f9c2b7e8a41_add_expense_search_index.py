@@ -0,0 +1,65 @@
+"""Add expense full-text search index
+
+Revision ID: 3f9c2b7e8a41
+Revises: 685ac5d7a61b
+Create Date: 2026-10-19 10:12:03.514227
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2b7e8a41'
+down_revision = '685ac5d7a61b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE expense_fts USING fts5(
+                description, group_id,
+                content='expense', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER expense_fts_ai AFTER INSERT ON expense BEGIN
+                INSERT INTO expense_fts(rowid, description, group_id)
+                VALUES (new.id, new.description, new.group_id);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER expense_fts_ad AFTER DELETE ON expense BEGIN
+                INSERT INTO expense_fts(expense_fts, rowid, description, group_id)
+                VALUES ('delete', old.id, old.description, old.group_id);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER expense_fts_au AFTER UPDATE ON expense BEGIN
+                INSERT INTO expense_fts(expense_fts, rowid, description, group_id)
+                VALUES ('delete', old.id, old.description, old.group_id);
+                INSERT INTO expense_fts(rowid, description, group_id)
+                VALUES (new.id, new.description, new.group_id);
+            END
+        """)
+        # Index the expenses that already exist.
+        op.execute("INSERT INTO expense_fts(expense_fts) VALUES ('rebuild')")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("""
+            CREATE INDEX ix_expense_search
+            ON expense USING GIN (to_tsvector('english', description))
+        """)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS expense_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS expense_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS expense_fts_ai")
+        op.execute("DROP TABLE IF EXISTS expense_fts")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_expense_search")
@@ -0,0 +1,134 @@
+"""Add expense feed projection
+
+Revision ID: c51e07d9a3f2
+Revises: a8d41c6f0b27
+Create Date: 2026-10-19 16:05:41.772390
+
+Alembic only migrates the default database, so expense_feed and the new
+indexes are also created on every shard in SHARD_DATABASE_URLS, and each
+database's feed is filled from its existing expenses. Shards added later get
+the table from `flask shards rebalance` or `flask feed rebuild`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = 'c51e07d9a3f2'
+down_revision = 'a8d41c6f0b27'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 500
+
+# Snapshot of the tables as of this revision, independent of models.py.
+meta = sa.MetaData()
+user_t = sa.Table('user', meta,
+    sa.Column('id', sa.Integer(), primary_key=True),
+    sa.Column('name', sa.String(length=80)),
+)
+expense_t = sa.Table('expense', meta,
+    sa.Column('id', sa.Integer(), primary_key=True),
+    sa.Column('group_id', sa.Integer()),
+    sa.Column('date', sa.DateTime()),
+    sa.Column('description', sa.String(length=200)),
+    sa.Column('total_amount', sa.Float()),
+    sa.Column('payer_id', sa.Integer(), index=True),
+    sa.Column('split_type', sa.String(length=10)),
+)
+share_t = sa.Table('expense_share', meta,
+    sa.Column('id', sa.Integer(), primary_key=True),
+    sa.Column('expense_id', sa.Integer()),
+    sa.Column('user_id', sa.Integer(), index=True),
+    sa.Column('amount_share', sa.Float()),
+)
+feed_t = sa.Table('expense_feed', meta,
+    sa.Column('expense_id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('description', sa.String(length=200), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('payer_id', sa.Integer(), nullable=False),
+    sa.Column('payer_name', sa.String(length=80), nullable=False),
+    sa.Column('split_type', sa.Enum('EQUAL', 'PERCENTAGE', 'CUSTOM', 'PREFERENCE', name='splittype'), nullable=False),
+    sa.Column('participants', sa.JSON(), nullable=False),
+    sa.PrimaryKeyConstraint('expense_id'),
+    sa.Index('ix_expense_feed_group_date', 'group_id', 'date'),
+)
+# Used to find a renamed user's expenses when refreshing their feed rows.
+new_indexes = [index for table in (expense_t, share_t) for index in table.indexes]
+
+
+def shard_engines():
+    db = current_app.extensions['migrate'].db
+    return [db.engines[key] for key in current_app.config.get('SHARD_KEYS', [])]
+
+
+def backfill(conn, users_conn):
+    """Fills expense_feed on `conn` from its expenses. User names come from users_conn."""
+    last_id = 0
+    while True:
+        expenses = conn.execute(
+            sa.select(expense_t).where(expense_t.c.id > last_id)
+            .order_by(expense_t.c.id).limit(BACKFILL_BATCH)
+        ).all()
+        if not expenses:
+            return
+        last_id = expenses[-1].id
+        shares = {}
+        for row in conn.execute(sa.select(share_t)
+                                .where(share_t.c.expense_id.in_([e.id for e in expenses]))
+                                .order_by(share_t.c.id)):
+            shares.setdefault(row.expense_id, []).append(row)
+        user_ids = {e.payer_id for e in expenses} | {s.user_id for rows in shares.values() for s in rows}
+        names = dict(users_conn.execute(sa.select(user_t.c.id, user_t.c.name).where(user_t.c.id.in_(user_ids))).all())
+        conn.execute(feed_t.insert(), [
+            {
+                'expense_id': e.id,
+                'group_id': e.group_id,
+                'date': e.date,
+                'description': e.description,
+                'total_amount': e.total_amount,
+                'payer_id': e.payer_id,
+                'payer_name': names.get(e.payer_id, ''),
+                'split_type': e.split_type,
+                'participants': [
+                    {'user_id': s.user_id, 'name': names.get(s.user_id, ''), 'amount': s.amount_share}
+                    for s in shares.get(e.id, [])
+                ],
+            } for e in expenses
+        ])
+
+
+def upgrade():
+    bind = op.get_bind()
+    feed_t.create(bind, checkfirst=True)
+    for index in new_indexes:
+        index.create(bind, checkfirst=True)
+    bind.execute(feed_t.delete())
+    backfill(bind, bind)
+
+    for engine in shard_engines():
+        with engine.begin() as conn:
+            if not sa.inspect(conn).has_table('expense'):
+                continue  # Never used yet; its tables get created from the models.
+            feed_t.create(conn, checkfirst=True)
+            for index in new_indexes:
+                index.create(conn, checkfirst=True)
+            conn.execute(feed_t.delete())
+            backfill(conn, bind)
+
+
+def downgrade():
+    # Plain DDL: Table.drop() would also try to drop the splittype enum that
+    # expense still uses on PostgreSQL.
+    drops = [sa.schema.DropTable(feed_t, if_exists=True)] + \
+            [sa.schema.DropIndex(index, if_exists=True) for index in new_indexes]
+    for engine in shard_engines():
+        with engine.begin() as conn:
+            for ddl in drops:
+                conn.execute(ddl)
+    for ddl in drops:
+        op.execute(ddl)
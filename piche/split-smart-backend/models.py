@@ -1,9 +1,33 @@
+from flask import g
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_bcrypt import Bcrypt
+import sqlalchemy as sa
 from sqlalchemy.dialects.sqlite import JSON
 import enum
 
-db = SQLAlchemy()
+# Tables holding a group's data. When shards are configured these live in the
+# group's shard database instead of the global one (see sharding.py).
+SHARDED_TABLES = {'group', 'group_member', 'expense', 'expense_share', 'expense_feed'}
+
+class ShardedSession(Session):
+    """Sends queries on group tables to the shard selected for the current request."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard_key = g.get('shard_key')
+        if bind is None and shard_key is not None:
+            table = None
+            if mapper is not None:
+                table = sa.inspect(mapper).local_table
+            elif isinstance(clause, sa.Table):
+                table = clause
+            elif isinstance(clause, sa.sql.dml.UpdateBase):
+                table = clause.table
+            if table is not None and table.name in SHARDED_TABLES:
+                return self._db.engines[shard_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': ShardedSession})
 bcrypt = Bcrypt()
 
 class Role(enum.Enum):
@@ -49,13 +73,26 @@ class Group(db.Model):
     
     admin = db.relationship('User', foreign_keys=[admin_user_id])
 
+class GroupShard(db.Model):
+    """Global directory of which shard holds each group; also allocates group ids."""
+    __tablename__ = 'group_shard'
+    group_id = db.Column(db.Integer, primary_key=True)
+    # Index into the configured shards; None means the default database.
+    shard = db.Column(db.Integer, nullable=True)
+
+class IdBlock(db.Model):
+    """Global counters handing out blocks of ids that must be unique across shards."""
+    __tablename__ = 'id_block'
+    name = db.Column(db.String(40), primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
+
 class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     total_amount = db.Column(db.Float, nullable=False)
     date = db.Column(db.DateTime, server_default=db.func.now())
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
-    payer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    payer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     
     split_type = db.Column(db.Enum(SplitType), nullable=False)
     # For PREFERENCE splits, stores tags like {'type': 'food', 'tags': ['non-veg', 'drinkers']}
@@ -66,8 +103,23 @@ class Expense(db.Model):
 class ExpenseShare(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     expense_id = db.Column(db.Integer, db.ForeignKey('expense.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     amount_share = db.Column(db.Float, nullable=False)
     
     user = db.relationship('User')
 
+class ExpenseFeed(db.Model):
+    """Read model for the expense feed: one row per expense, rendered without joins (see feed.py)."""
+    __tablename__ = 'expense_feed'
+    expense_id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.DateTime)
+    description = db.Column(db.String(200), nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    payer_id = db.Column(db.Integer, nullable=False)
+    payer_name = db.Column(db.String(80), nullable=False)
+    split_type = db.Column(db.Enum(SplitType), nullable=False)
+    # [{'user_id': 2, 'name': 'Bob', 'amount': 50.0}, ...]
+    participants = db.Column(JSON, nullable=False)
+
+    __table_args__ = (db.Index('ix_expense_feed_group_date', 'group_id', 'date'),)
@@ -0,0 +1,161 @@
+import html
+import re
+
+from sqlalchemy import event, text
+
+from models import db, Expense
+
+# Columns of `expense` covered by the full-text index. Add category/notes here
+# (and in a migration) once those fields exist on the model.
+SEARCH_COLUMNS = ('description',)
+
+MAX_PER_PAGE = 100
+# OFFSET is bound as a signed 64-bit integer; larger values overflow the driver.
+MAX_OFFSET = 2**63 - 1
+
+# The database marks matches with these control characters instead of tags, so
+# the description can be HTML-escaped before the real <mark> tags go in.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SQLITE_SEARCH_DDL = [
+    # External-content FTS5 table: the text lives only in `expense`, the index
+    # stores postings. group_id is indexed too so a group filter is a postings
+    # intersection instead of a post-filter over every match in the database.
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS expense_fts USING fts5(
+        description, group_id,
+        content='expense', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS expense_fts_ai AFTER INSERT ON expense BEGIN
+        INSERT INTO expense_fts(rowid, description, group_id)
+        VALUES (new.id, new.description, new.group_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS expense_fts_ad AFTER DELETE ON expense BEGIN
+        INSERT INTO expense_fts(expense_fts, rowid, description, group_id)
+        VALUES ('delete', old.id, old.description, old.group_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS expense_fts_au AFTER UPDATE ON expense BEGIN
+        INSERT INTO expense_fts(expense_fts, rowid, description, group_id)
+        VALUES ('delete', old.id, old.description, old.group_id);
+        INSERT INTO expense_fts(rowid, description, group_id)
+        VALUES (new.id, new.description, new.group_id);
+    END
+    """,
+    "INSERT INTO expense_fts(expense_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_SEARCH_DDL = [
+    """
+    CREATE INDEX IF NOT EXISTS ix_expense_search
+    ON expense USING GIN (to_tsvector('english', description))
+    """,
+]
+
+
+def create_search_index(connection):
+    """Creates the full-text index objects for the connection's dialect."""
+    if connection.dialect.name == 'sqlite':
+        statements = SQLITE_SEARCH_DDL
+    elif connection.dialect.name == 'postgresql':
+        statements = POSTGRES_SEARCH_DDL
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+# `flask init-db` builds the schema with create_all(), which bypasses the
+# migrations, so hook the index onto the table creation as well.
+@event.listens_for(Expense.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    create_search_index(connection)
+
+
+def _terms(query):
+    return re.findall(r'\w+', query, flags=re.UNICODE)
+
+
+def _highlight_html(marked):
+    """Escapes a description for HTML, then turns the match markers into <mark> tags."""
+    return html.escape(marked).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search_expenses(group_id, query, page=1, per_page=20):
+    """
+    Runs a ranked full-text search over a group's expenses.
+
+    :param group_id: The group to search in.
+    :param query: Free text from the user; every word must match, the last one as a prefix.
+    :param page: 1-based page number.
+    :param per_page: Page size, capped at MAX_PER_PAGE.
+    :return: A (results, has_more) tuple; each result is a dict with the expense
+             fields, an HTML-safe `highlight` of the description and its `rank`.
+    """
+    terms = _terms(query)
+    if not terms:
+        return [], False
+
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    params = {
+        'group_id': group_id,
+        # Fetch one extra row so we can tell whether another page exists
+        # without counting every match.
+        'limit': per_page + 1,
+        'offset': (max(page, 1) - 1) * per_page,
+    }
+
+    if db.session.get_bind(Expense).dialect.name == 'postgresql':
+        params['q'] = ' & '.join(f"{t}:*" if i == len(terms) - 1 else t for i, t in enumerate(terms))
+        params['headline_options'] = f'StartSel={MARK_START}, StopSel={MARK_END}, HighlightAll=true'
+        sql = text("""
+            SELECT e.id, e.description, e.total_amount, e.date, e.payer_id,
+                   ts_headline('english', e.description, q, :headline_options) AS highlight,
+                   ts_rank(to_tsvector('english', e.description), q) AS rank
+            FROM expense e, to_tsquery('english', :q) q
+            WHERE e.group_id = :group_id
+              AND to_tsvector('english', e.description) @@ q
+            ORDER BY rank DESC, e.id DESC
+            LIMIT :limit OFFSET :offset
+        """)
+    else:
+        # Quote every term so user input can never be parsed as FTS5 syntax.
+        words = ' '.join(f'"{t}"' for t in terms) + '*'
+        columns = ' '.join(SEARCH_COLUMNS)
+        params['q'] = f'group_id : "{int(group_id)}" AND {{{columns}}} : ({words})'
+        params['mark_start'] = MARK_START
+        params['mark_end'] = MARK_END
+        sql = text("""
+            SELECT e.id, e.description, e.total_amount, e.date, e.payer_id,
+                   highlight(expense_fts, 0, :mark_start, :mark_end) AS highlight,
+                   bm25(expense_fts, 1.0, 0.0) AS rank
+            FROM expense_fts
+            JOIN expense e ON e.id = expense_fts.rowid
+            WHERE expense_fts MATCH :q
+            ORDER BY rank, e.id DESC
+            LIMIT :limit OFFSET :offset
+        """)
+
+    sql = sql.columns(date=db.DateTime)
+    # Raw SQL carries no mapper, so point the session at the group's shard explicitly.
+    rows = db.session.execute(sql, params, bind_arguments={'mapper': Expense}).mappings().all()
+    has_more = len(rows) > per_page
+    results = []
+    for row in rows[:per_page]:
+        results.append({
+            "id": row['id'],
+            "description": row['description'],
+            "amount": row['total_amount'],
+            "date": row['date'].isoformat(),
+            "paidBy": row['payer_id'],
+            "highlight": _highlight_html(row['highlight']),
+            "rank": row['rank'],
+        })
+    return results, has_more
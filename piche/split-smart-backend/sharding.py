@@ -0,0 +1,311 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import click
+from flask import current_app, g
+from flask.cli import AppGroup
+from sqlalchemy import case, event, func, select
+
+from models import db, ShardedSession, Group, GroupMember, GroupShard, IdBlock, Expense, ExpenseShare, ExpenseFeed
+
+# Group tables in foreign-key order, used when creating or moving group data.
+SHARDED_MODELS = [Group, GroupMember, Expense, ExpenseShare, ExpenseFeed]
+
+shards_cli = AppGroup('shards', help='Manage group shard databases.')
+
+# Expense ids are reserved from the global id_block table this many at a time,
+# so creating an expense rarely has to write to the global database.
+EXPENSE_ID_BLOCK = 1000
+
+# Unused ids of a committed block, per global database, shared by every
+# session in this process.
+_expense_ids = {}
+_expense_ids_lock = threading.Lock()
+# A forked worker must not hand out the same ids as its parent.
+os.register_at_fork(after_in_child=_expense_ids.clear)
+
+
+def init_sharding(app):
+    """
+    Registers one SQLAlchemy bind per shard database.
+
+    Shards are listed in SHARD_DATABASE_URLS (comma-separated). Without it every
+    group stays in the default database and nothing else changes. Must run
+    before db.init_app().
+    """
+    urls = app.config.get('SHARD_DATABASE_URLS')
+    if urls is None:
+        urls = [u.strip() for u in os.getenv('SHARD_DATABASE_URLS', '').split(',') if u.strip()]
+    keys = [f'shard{i}' for i in range(len(urls))]
+    app.config['SHARD_KEYS'] = keys
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    binds.update(zip(keys, urls))
+
+    if keys:
+        app.url_value_preprocessor(_select_group_shard)
+
+
+def _select_group_shard(endpoint, values):
+    if values and 'group_id' in values:
+        try:
+            g.shard_key = shard_for_group(values['group_id'])
+        except LookupError:
+            # The group doesn't exist in the default database either, so the view
+            # answers exactly as without sharding: 401 before login, 403 after.
+            # Answering here would run before authentication and reveal which
+            # group ids exist.
+            g.shard_key = None
+
+
+def shard_keys():
+    return current_app.config.get('SHARD_KEYS', [])
+
+
+def target_shard(group_id):
+    """Index of the shard a group belongs on with the current shard count."""
+    return group_id % len(shard_keys())
+
+
+def shard_for_group(group_id):
+    """
+    Looks up the bind key of the shard holding a group.
+
+    :return: The bind key, or None when the group lives in the default database
+             (sharding disabled, or a group not rebalanced since shards were added).
+    :raises LookupError: If the group has no directory entry, i.e. doesn't exist.
+    """
+    if not shard_keys():
+        return None
+    entry = db.session.get(GroupShard, group_id)
+    if entry is None:
+        raise LookupError(f"Group {group_id} is not in the shard directory.")
+    if entry.shard is None:
+        return None
+    return shard_keys()[entry.shard]
+
+
+def group_homes(group_ids=None):
+    """
+    Maps group ids to the bind key of the database the directory puts them in.
+
+    :param group_ids: Only look these groups up; all groups when None.
+    :return: {group_id: bind key, or None for the default database}. Empty when
+             sharding is disabled, since everything is in the default database.
+    """
+    keys = shard_keys()
+    if not keys:
+        return {}
+    entries = GroupShard.query
+    if group_ids is not None:
+        entries = entries.filter(GroupShard.group_id.in_(group_ids))
+    return {e.group_id: None if e.shard is None else keys[e.shard] for e in entries}
+
+
+@contextmanager
+def using_shard(shard_key):
+    """Routes group tables to `shard_key` (None = default database) inside the block."""
+    previous = g.get('shard_key')
+    g.shard_key = shard_key
+    try:
+        yield
+    finally:
+        g.shard_key = previous
+
+
+def each_shard():
+    """
+    Yields once per database that can hold group data, with the session routed to it.
+
+    Used for cross-shard reads such as "my groups". The default database is
+    always included since groups created before sharding stay there until
+    rebalanced.
+    """
+    for key in [None] + shard_keys():
+        with using_shard(key):
+            yield key
+
+
+def place_new_group():
+    """
+    Allocates an id for a new group and routes the session to its shard.
+
+    Ids always come from the directory, even with sharding disabled, so groups
+    created before shards are added can never clash with ones created after.
+
+    :return: The group id to create the Group with.
+    """
+    entry = GroupShard(shard=None)
+    db.session.add(entry)
+    db.session.flush()
+    if shard_keys():
+        entry.shard = target_shard(entry.group_id)
+        g.shard_key = shard_keys()[entry.shard]
+    return entry.group_id
+
+
+def _reserve_expense_ids(session):
+    """Reserves the next block of expense ids in the session's transaction."""
+    table = IdBlock.__table__
+    # Never hand out ids below the ones already used in the default database,
+    # where expenses get autoincrement ids while sharding is disabled.
+    floor = select(func.coalesce(func.max(Expense.__table__.c.id), 0) + 1).scalar_subquery()
+    result = session.execute(
+        table.update()
+        .where(table.c.name == 'expense')
+        .values(next_id=case((floor > table.c.next_id, floor), else_=table.c.next_id) + EXPENSE_ID_BLOCK)
+    )
+    if result.rowcount == 0:
+        session.execute(table.insert().values(name='expense', next_id=floor + EXPENSE_ID_BLOCK))
+    end = session.execute(select(table.c.next_id).where(table.c.name == 'expense')).scalar_one()
+    return end - EXPENSE_ID_BLOCK, end
+
+
+def _next_expense_id(session):
+    # A block reserved by this session can't be shared until the session
+    # commits: if it rolled back, another process could reserve it again.
+    pending = session.info.get('expense_ids')
+    if pending and pending[0] < pending[1]:
+        pending[0] += 1
+        return pending[0] - 1
+    with _expense_ids_lock:
+        shared = _expense_ids.setdefault(str(db.engine.url), [0, 0])
+        if shared[0] < shared[1]:
+            shared[0] += 1
+            return shared[0] - 1
+    start, end = _reserve_expense_ids(session)
+    session.info['expense_ids'] = [start + 1, end]
+    return start
+
+
+@event.listens_for(ShardedSession, 'before_flush')
+def _assign_expense_ids(session, flush_context, instances):
+    # Expense ids must be unique across shards so a group can move with its
+    # expense ids unchanged. Without shards the database assigns them.
+    if not shard_keys():
+        return
+    for obj in session.new:
+        if isinstance(obj, Expense) and obj.id is None:
+            obj.id = _next_expense_id(session)
+
+
+@event.listens_for(ShardedSession, 'after_commit')
+def _share_expense_ids(session):
+    pending = session.info.pop('expense_ids', None)
+    if pending and pending[0] < pending[1]:
+        with _expense_ids_lock:
+            shared = _expense_ids.setdefault(str(db.engine.url), [0, 0])
+            if shared[0] >= shared[1]:
+                shared[:] = pending
+
+
+@event.listens_for(ShardedSession, 'after_transaction_end')
+def _drop_expense_ids(session, transaction):
+    # Still here after the outermost transaction ended means it rolled back.
+    if transaction.parent is None:
+        session.info.pop('expense_ids', None)
+
+
+def create_shard_tables():
+    for key in shard_keys():
+        db.metadata.create_all(db.engines[key], tables=[m.__table__ for m in SHARDED_MODELS])
+
+
+def _read_group_rows(conn, group_id):
+    group_t, member_t, expense_t, share_t, feed_t = (m.__table__ for m in SHARDED_MODELS)
+    expense_ids = select(expense_t.c.id).where(expense_t.c.group_id == group_id)
+    # Share ids are per-database autoincrements and nothing references them,
+    # so the destination assigns new ones instead of risking a clash.
+    share_columns = [c for c in share_t.c if c.name != 'id']
+    queries = [
+        (group_t, group_t.select().where(group_t.c.id == group_id)),
+        (member_t, member_t.select().where(member_t.c.group_id == group_id)),
+        (expense_t, expense_t.select().where(expense_t.c.group_id == group_id)),
+        (share_t, select(*share_columns).where(share_t.c.expense_id.in_(expense_ids)).order_by(share_t.c.id)),
+        (feed_t, feed_t.select().where(feed_t.c.expense_id.in_(expense_ids))),
+    ]
+    return [(table, [dict(r) for r in conn.execute(query).mappings()]) for table, query in queries]
+
+
+def _delete_group_rows(conn, group_id):
+    group_t, member_t, expense_t, share_t, feed_t = (m.__table__ for m in SHARDED_MODELS)
+    expense_ids = select(expense_t.c.id).where(expense_t.c.group_id == group_id)
+    conn.execute(feed_t.delete().where(feed_t.c.expense_id.in_(expense_ids)))
+    conn.execute(share_t.delete().where(share_t.c.expense_id.in_(expense_ids)))
+    conn.execute(expense_t.delete().where(expense_t.c.group_id == group_id))
+    conn.execute(member_t.delete().where(member_t.c.group_id == group_id))
+    conn.execute(group_t.delete().where(group_t.c.id == group_id))
+
+
+def _engine(shard_key):
+    return db.engines[shard_key] if shard_key else db.engine
+
+
+def move_group(group_id, source_key, target):
+    """
+    Moves one group's rows to shard number `target`, keeping group and expense ids.
+
+    Steps, each committed on its own: copy to the destination, point the
+    directory at it, delete the originals. If a step fails, the copy left
+    behind is never the one the directory points at. The destination copy is
+    replaced on the next attempt, and purge_stale_copies() removes a stale
+    source copy.
+    """
+    with _engine(source_key).connect() as src:
+        rows = _read_group_rows(src, group_id)
+
+    with _engine(shard_keys()[target]).begin() as dst:
+        _delete_group_rows(dst, group_id)
+        for table, table_rows in rows:
+            if table_rows:
+                dst.execute(table.insert(), table_rows)
+
+    db.session.get(GroupShard, group_id).shard = target
+    db.session.commit()
+
+    with _engine(source_key).begin() as src:
+        _delete_group_rows(src, group_id)
+
+
+def purge_stale_copies():
+    """Deletes group rows from every database the directory doesn't point the group at."""
+    homes = group_homes()
+    purged = 0
+    for shard_key in [None] + shard_keys():
+        with _engine(shard_key).begin() as conn:
+            group_t = Group.__table__
+            for (group_id,) in conn.execute(select(group_t.c.id)).all():
+                if group_id in homes and homes[group_id] != shard_key:
+                    _delete_group_rows(conn, group_id)
+                    purged += 1
+    return purged
+
+
+@shards_cli.command('rebalance')
+@click.option('--dry-run', is_flag=True, help='Only list the groups that would move.')
+def rebalance_command(dry_run):
+    """Move groups onto the shard they belong on for the current shard count."""
+    keys = shard_keys()
+    if not keys:
+        raise click.ClickException('No shards configured (set SHARD_DATABASE_URLS).')
+    entries = GroupShard.query.order_by(GroupShard.group_id).all()
+    if any(e.shard is not None and e.shard >= len(keys) for e in entries):
+        raise click.ClickException('Some groups are on shards that are no longer configured; '
+                                   'shrinking the shard list is not supported.')
+    create_shard_tables()
+
+    # Entries without a shard are groups still in the default database.
+    moves = [(e.group_id, None if e.shard is None else keys[e.shard])
+             for e in entries if e.shard != target_shard(e.group_id)]
+
+    for group_id, source_key in moves:
+        target = target_shard(group_id)
+        click.echo(f'group {group_id}: {source_key or "default"} -> {keys[target]}')
+        if not dry_run:
+            move_group(group_id, source_key, target)
+
+    if not dry_run:
+        purged = purge_stale_copies()
+        if purged:
+            click.echo(f'Removed {purged} stale group copy(ies) left by an interrupted move.')
+    click.echo(f'{len(moves)} group(s) {"to move" if dry_run else "moved"}.')
@@ -1,4 +1,4 @@
-from models import SplitType, Expense, ExpenseShare, User
+from models import SplitType
 
 def calculate_shares(total_amount, split_type, participants_data, group_members):
     """
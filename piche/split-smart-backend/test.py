@@ -34,6 +34,11 @@ def print_test_result(name, response):
         print(f"     Response: (Not JSON) {response.text}")
     return response.ok
 
+def print_check(name, passed, detail):
+    status = "✅ PASSED" if passed else "❌ FAILED"
+    print(f"     - {name}: {status} ({detail})")
+    return passed
+
 def auth_headers(user_name):
     token = test_state["tokens"].get(user_name)
     if not token:
@@ -97,6 +102,16 @@ def run_all_tests():
         return # Stop if Bob can't be added
     # --- END OF NEW PART ---
 
+    # Batch add: both users are already members and the last email doesn't exist,
+    # so every entry should be reported back without adding anyone
+    batch_payload = {'members': [bob_id, users_data[0]['email'], 'nobody@example.com']}
+    resp = requests.post(f'{BASE_URL}/groups/{group_id}/members:batch', json=batch_payload, headers=auth_headers('Alice'))
+    if print_test_result("Batch Add Members (nothing new to add)", resp):
+        body = resp.json()
+        statuses = [r['status'] for r in body['results']]
+        print_check("Nobody added", body['added'] == 0, body['added'])
+        print_check("Entries reported", statuses == ['already_member', 'already_member', 'not_found'], statuses)
+
     # Alice gets her list of groups
     resp = requests.get(f'{BASE_URL}/groups', headers=auth_headers('Alice'))
     print_test_result("Get User's Groups (Alice)", resp)
@@ -158,6 +173,12 @@ def run_all_tests():
     resp = requests.get(f'{BASE_URL}/groups/{group_id}/expenses', headers=auth_headers('Alice'))
     print_test_result("Get All Group Expenses", resp)
 
+    # Search by a prefix of one description. The API has no endpoint to add
+    # expenses yet, so only the request itself is checked here; test_app.py
+    # covers the matching and highlighting with expenses inserted directly.
+    resp = requests.get(f'{BASE_URL}/groups/{group_id}/expenses/search', params={'q': 'hot'}, headers=auth_headers('Alice'))
+    print_test_result("Search Expenses ('hot')", resp)
+
     # 5. Balance and Settlement Flow
     print_test_title("Balance and Settlement")
     # Get the final balances after all expenses
@@ -0,0 +1,169 @@
+"""
+In-process checks that test.py can't do against a running server: they insert
+rows directly and drive the app through its test client and CLI runner.
+
+Each check builds the app on fresh SQLite files in a temporary directory.
+Run with `python -m pytest test_app.py` or `python test_app.py`.
+"""
+import tempfile
+from unittest import mock
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from models import db, User, Group, GroupShard, Expense, ExpenseShare, SplitType
+import sharding
+from sharding import each_shard, shard_for_group, using_shard
+
+JWT_SECRET_KEY = 'test-secret-key-0123456789abcdef0123'
+
+
+def make_app(tmp, shards=0):
+    return create_app({
+        'DEBUG': False,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/global.db',
+        'SHARD_DATABASE_URLS': [f'sqlite:///{tmp}/shard{i}.db' for i in range(shards)],
+        'JWT_SECRET_KEY': JWT_SECRET_KEY,
+    })
+
+
+def add_users(app, *names):
+    """Creates users and returns an auth header for each, in order."""
+    with app.app_context():
+        users = [User(email=f'{name.lower()}@example.com', name=name, password_hash='x') for name in names]
+        db.session.add_all(users)
+        db.session.commit()
+        return [{'Authorization': f'Bearer {create_access_token(identity=str(u.id))}'} for u in users]
+
+
+def add_expense(group_id, description, payer_id, amount=10.0):
+    """Inserts an expense paid and fully owed by one user (the API has no endpoint for it)."""
+    with using_shard(shard_for_group(group_id)):
+        expense = Expense(description=description, total_amount=amount, group_id=group_id,
+                          payer_id=payer_id, split_type=SplitType.EQUAL)
+        expense.shares = [ExpenseShare(user_id=payer_id, amount_share=amount)]
+        db.session.add(expense)
+        db.session.commit()
+        return expense.id
+
+
+def group_copies(app):
+    """Maps each database (None = default) to the group ids it holds."""
+    with app.app_context():
+        return {key: sorted(db.session.scalars(db.select(Group.id))) for key in each_shard()}
+
+
+def test_search_matches_and_highlights():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp)
+        assert app.test_cli_runner().invoke(args=['init-db']).exit_code == 0
+        alice, = add_users(app, 'Alice')
+        client = app.test_client()
+        group_id = client.post('/api/groups', json={'name': 'Trip'}, headers=alice).json['id']
+        with app.app_context():
+            for description in ('Hotel Stay', 'Fuel', '<b>Hot</b> drinks'):
+                add_expense(group_id, description, payer_id=1)
+
+        url = f'/api/groups/{group_id}/expenses/search'
+        results = client.get(url, query_string={'q': 'hote'}, headers=alice).json['results']
+        assert [r['description'] for r in results] == ['Hotel Stay']
+        assert results[0]['highlight'] == '<mark>Hotel</mark> Stay'
+
+        # Descriptions are escaped; only the <mark> tags are markup.
+        results = client.get(url, query_string={'q': 'drinks'}, headers=alice).json['results']
+        assert results[0]['highlight'] == '&lt;b&gt;Hot&lt;/b&gt; <mark>drinks</mark>'
+
+        resp = client.get(url, query_string={'q': 'hot', 'page': 10**20}, headers=alice)
+        assert resp.status_code == 400, resp.status_code
+
+
+def test_rebalance_into_non_empty_shards():
+    with tempfile.TemporaryDirectory() as tmp:
+        # One group from before sharding, then one per shard, each with an expense.
+        app = make_app(tmp)
+        assert app.test_cli_runner().invoke(args=['init-db']).exit_code == 0
+        alice, = add_users(app, 'Alice')
+        groups = [app.test_client().post('/api/groups', json={'name': 'Before shards'}, headers=alice).json['id']]
+        app = make_app(tmp, shards=2)
+        assert app.test_cli_runner().invoke(args=['init-db']).exit_code == 0
+        groups += [app.test_client().post('/api/groups', json={'name': f'Group {i}'}, headers=alice).json['id']
+                   for i in range(2)]
+        with app.app_context():
+            expenses = {group_id: add_expense(group_id, f'Expense of {group_id}', payer_id=1)
+                        for group_id in groups}
+
+        # The first move lands group 1 next to group 3, the second moves group 3
+        # into shard0, which already holds group 2's shares.
+        for shards in (2, 3):
+            app = make_app(tmp, shards=shards)
+            result = app.test_cli_runner().invoke(args=['shards', 'rebalance'])
+            assert result.exit_code == 0, result.output + repr(result.exception)
+
+        with app.app_context():
+            homes = {e.group_id: e.shard for e in GroupShard.query}
+        assert homes == {group_id: group_id % 3 for group_id in groups}
+        assert group_copies(app) == {None: [], 'shard0': [3], 'shard1': [1], 'shard2': [2]}
+
+        client = app.test_client()
+        for group_id in groups:
+            feed = client.get(f'/api/groups/{group_id}/expenses', headers=alice).json
+            assert [e['id'] for e in feed] == [expenses[group_id]]
+            assert feed[0]['participants'] == [{'user_id': 1, 'name': 'Alice', 'amount': 10.0}]
+            balances = client.get(f'/api/groups/{group_id}/balances', headers=alice).json
+            assert balances == [{'user_id': 1, 'balance': 0.0}]
+
+
+def test_interrupted_move_lists_each_group_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp, shards=2)
+        assert app.test_cli_runner().invoke(args=['init-db']).exit_code == 0
+        alice, = add_users(app, 'Alice')
+        for name in ('One', 'Two'):
+            app.test_client().post('/api/groups', json={'name': name}, headers=alice)
+
+        # Growing to 3 shards moves group 2 from shard0 to shard2; fail the
+        # move after the directory update, before the source copy is deleted.
+        app = make_app(tmp, shards=3)
+        delete_group_rows = sharding._delete_group_rows
+        deletes = []
+        def interrupted(conn, group_id):
+            deletes.append(group_id)
+            if len(deletes) == 2:
+                raise RuntimeError('interrupted')
+            delete_group_rows(conn, group_id)
+        with mock.patch.object(sharding, '_delete_group_rows', interrupted):
+            assert app.test_cli_runner().invoke(args=['shards', 'rebalance']).exit_code == 1
+        assert group_copies(app) == {None: [], 'shard0': [2], 'shard1': [1], 'shard2': [2]}
+
+        groups = app.test_client().get('/api/groups', headers=alice).json
+        assert sorted(g['id'] for g in groups) == [1, 2]
+
+        result = app.test_cli_runner().invoke(args=['shards', 'rebalance'])
+        assert 'Removed 1 stale' in result.output, result.output
+        assert group_copies(app) == {None: [], 'shard0': [], 'shard1': [1], 'shard2': [2]}
+
+
+def test_unknown_group_answers_like_a_forbidden_one():
+    for shards in (0, 2):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(tmp, shards=shards)
+            assert app.test_cli_runner().invoke(args=['init-db']).exit_code == 0
+            alice, bob = add_users(app, 'Alice', 'Bob')
+            client = app.test_client()
+            group_id = client.post('/api/groups', json={'name': 'Trip'}, headers=alice).json['id']
+            for url in (f'/api/groups/{group_id}/expenses', '/api/groups/9999/expenses'):
+                assert client.get(url).status_code == 401, (shards, url)
+                assert client.get(url, headers=bob).status_code == 403, (shards, url)
+
+
+if __name__ == '__main__':
+    checks = [f for name, f in list(globals().items()) if name.startswith('test_') and callable(f)]
+    failed = 0
+    for check in checks:
+        try:
+            check()
+            print(f"  -> {check.__name__}: ✅ PASSED")
+        except Exception as e:
+            failed += 1
+            print(f"  -> {check.__name__}: ❌ FAILED ({type(e).__name__}: {e})")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,4 @@
+# Entry point for production web workers, e.g. `gunicorn wsgi:app`.
+from app import create_app
+
+app = create_app({'DEBUG': False, 'REGISTER_CLI': False})